@@ -1,21 +1,187 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
-import PyPDF2
+import pypdfium2 as pdfium
 import pdfplumber
 from docx import Document
 import openpyxl
 from pptx import Presentation
-import pytesseract
-from pdf2image import convert_from_bytes
+from tesserocr import PyTessBaseAPI
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
-import io
+import numpy as np
+import cv2
 import base64
-from langdetect import detect
+import fasttext
+from charset_normalizer import from_bytes
 import tempfile
 import os
-from typing import Dict, Any, List
+import hashlib
+import logging
+from diskcache import Cache
+import asyncio
+import multiprocessing
+import threading
+from collections import Counter, deque
+from functools import partial
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
 app = FastAPI(title="Document Extractor Service")
+logger = logging.getLogger(__name__)
+
+CPU_COUNT = os.cpu_count() or 1
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Tamaño de bloque al volcar la subida a disco
+# Directorio para el archivo subido; con un tmpfs (p. ej. /dev/shm) los procesos
+# del pool leen las mismas páginas en memoria. Por defecto, el temporal del sistema
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or None
+ENCODING_SAMPLE_SIZE = 64 * 1024  # Bytes usados para detectar la codificación de textos
+# Codificaciones candidatas; sin restringirlas, el español en Windows-1252 sale como cp1250
+TEXT_ENCODINGS = ['utf_8', 'utf_16', 'cp1252', 'latin_1']
+
+# Caché en disco de resultados de extracción, indexada por hash del contenido
+CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', os.path.expanduser('~/.cache/docextract'))
+CACHE_SIZE_LIMIT = int(os.getenv('EXTRACTION_CACHE_SIZE_LIMIT', 1024 ** 3))
+_result_cache = Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT)
+# Forma parte de la clave: subirla al cambiar los extractores invalida los resultados previos
+CACHE_VERSION = 2
+# Claves de metadata con las que un paso de la extracción registra su fallo
+RESULT_ERROR_KEYS = ('extraction_error', 'fallback_error', 'table_error', 'ocr_error')
+
+# Pool de procesos para trabajo CPU (parseo de PDF, OCR); se crea al arrancar la app
+_process_pool: Optional[ProcessPoolExecutor] = None
+# Limita las tareas en vuelo entre peticiones concurrentes
+_pool_slots = threading.BoundedSemaphore(CPU_COUNT)
+# Protege la sustitución del pool cuando un worker muere
+_pool_lock = threading.Lock()
+
+OCR_MIN_PAGE_CHARS = 20  # Páginas con menos texto extraíble se consideran escaneadas
+OCR_PIPELINE_DEPTH = 4  # Páginas rasterizadas por adelantado en cada proceso de OCR
+# Páginas por tarea de OCR; lotes pequeños dejan que las peticiones concurrentes
+# se intercalen en el pool en lugar de esperar a que termine un PDF grande
+OCR_BATCH_PAGES = 4
+
+# Modelo de identificación de idioma de fastText (lid.176), cargado una sola vez
+LID_MODEL_PATH = os.getenv('LID_MODEL_PATH', 'lid.176.ftz')
+LANGUAGE_SAMPLE_SIZE = 500  # Caracteres por muestra para detectar el idioma
+_lid_model = None
+
+# PDFium no es thread-safe, ni siquiera entre documentos distintos
+_pdfium_lock = threading.Lock()
+
+# API de tesseract residente, una por proceso; no es reentrante
+_tess_api: Optional[PyTessBaseAPI] = None
+_tess_lock = threading.Lock()
+
+def _new_process_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=CPU_COUNT,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+@app.on_event("startup")
+async def start_process_pool():
+    global _process_pool
+    _process_pool = _new_process_pool()
+
+@app.on_event("startup")
+async def load_language_model():
+    # La detección de idioma es opcional: sin el modelo el servicio arranca igual
+    # y _detect_language responde 'unknown'
+    try:
+        _get_lid_model()
+    except Exception as e:
+        logger.warning("No se pudo cargar el modelo de idioma %s: %s", LID_MODEL_PATH, e)
+
+@app.on_event("shutdown")
+async def stop_process_pool():
+    global _process_pool
+    with _pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+def _replace_broken_pool(broken: ProcessPoolExecutor) -> Optional[ProcessPoolExecutor]:
+    """Sustituye un pool roto (un worker murió, p. ej. por un segfault) y devuelve el vigente"""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is broken:
+            _process_pool = _new_process_pool()
+            broken.shutdown(wait=False, cancel_futures=True)
+        return _process_pool
+
+def _on_pool_task_done(pool: ProcessPoolExecutor, future: Future) -> None:
+    """Libera la plaza de la tarea y repone el pool si la tarea lo dejó roto"""
+    _pool_slots.release()
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _replace_broken_pool(pool)
+
+def _submit_to_pool(fn: Callable, *args) -> Future:
+    """Envía trabajo CPU al pool de procesos, limitando las tareas en vuelo"""
+    pool = _process_pool
+    if pool is None:
+        # Sin pool (fuera del ciclo de vida de la app): ejecutar en el mismo hilo
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    _pool_slots.acquire()
+    try:
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            # El pool quedó roto por una tarea anterior: reponerlo y reintentar una vez
+            pool = _replace_broken_pool(pool)
+            if pool is None:
+                raise
+            future = pool.submit(fn, *args)
+    except BaseException:
+        _pool_slots.release()
+        raise
+    
+    future.add_done_callback(partial(_on_pool_task_done, pool))
+    return future
+
+def _get_lid_model():
+    """Devuelve el modelo de idioma, cargándolo la primera vez"""
+    global _lid_model
+    if _lid_model is None:
+        _lid_model = fasttext.load_model(LID_MODEL_PATH)
+    return _lid_model
+
+def _detect_language(text: str) -> str:
+    """Detecta el idioma del texto (código ISO 639-1, p. ej. 'es')"""
+    # Muestras del inicio, el medio y el final (la portada suele ser poco representativa);
+    # un texto corto se evalúa entero
+    if len(text) <= LANGUAGE_SAMPLE_SIZE:
+        samples = [text]
+    else:
+        starts = (0, len(text) // 2, len(text) - LANGUAGE_SAMPLE_SIZE)
+        samples = [text[start:start + LANGUAGE_SAMPLE_SIZE] for start in starts]
+    
+    # fastText no admite saltos de línea en la entrada de predict
+    labels, _ = _get_lid_model().predict([sample.replace('\n', ' ') for sample in samples])
+    
+    # Voto por mayoría; en empate gana la primera muestra
+    votes = Counter(sample_labels[0].replace('__label__', '') for sample_labels in labels)
+    return votes.most_common(1)[0][0]
+
+def _split_batches(items: List, batches: int = CPU_COUNT) -> List[List]:
+    """Reparte los elementos en lotes contiguos, uno por proceso"""
+    batch_size = -(-len(items) // batches) or 1
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+def _spool_upload(source, destination) -> str:
+    """Copia la subida a disco por bloques y devuelve el hash de su contenido"""
+    digest = hashlib.blake2b(digest_size=16)
+    while chunk := source.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
 
 @app.get("/")
 async def health_check():
@@ -36,58 +202,66 @@ def create_smart_chunks(text: str, chunk_size: int = 4000, overlap: int = 400) -
     
     # Dividir por párrafos primero (más inteligente que por oraciones)
     paragraphs = text.split('\n\n')
-    current_chunk = ""
+    # El chunk actual se acumula como lista de partes y se une una sola vez al cerrarlo,
+    # en lugar de reconstruir el string con cada concatenación
+    current_parts = []
+    current_length = 0
     chunk_index = 0
     start_position = 0
     
     for paragraph in paragraphs:
         # Si el párrafo solo cabe en un nuevo chunk
-        if len(current_chunk) + len(paragraph) + 2 > chunk_size:
-            if current_chunk:
+        if current_length + len(paragraph) + 2 > chunk_size:
+            if current_length:
+                current_chunk = ''.join(current_parts)
                 chunks.append({
                     'content': current_chunk.strip(),
                     'chunk_index': chunk_index,
                     'start_position': start_position,
-                    'end_position': start_position + len(current_chunk)
+                    'end_position': start_position + current_length
                 })
                 chunk_index += 1
                 
                 # Overlap: tomar las últimas líneas del chunk anterior
-                lines = current_chunk.split('\n')
-                overlap_lines = lines[-5:] if len(lines) > 5 else lines
-                overlap_text = '\n'.join(overlap_lines)
+                overlap_text = '\n'.join(current_chunk.rsplit('\n', 5)[-5:])
                 
-                start_position = start_position + len(current_chunk) - len(overlap_text)
-                current_chunk = overlap_text + "\n\n" + paragraph
+                start_position = start_position + current_length - len(overlap_text)
+                current_parts = [overlap_text, "\n\n", paragraph]
+                current_length = len(overlap_text) + 2 + len(paragraph)
             else:
                 # Si un párrafo es muy largo, dividirlo por oraciones
                 if len(paragraph) > chunk_size:
                     sentences = paragraph.split('. ')
                     for sentence in sentences:
-                        if len(current_chunk) + len(sentence) + 2 > chunk_size:
+                        if current_length + len(sentence) + 2 > chunk_size:
                             chunks.append({
-                                'content': current_chunk.strip(),
+                                'content': ''.join(current_parts).strip(),
                                 'chunk_index': chunk_index,
                                 'start_position': start_position,
-                                'end_position': start_position + len(current_chunk)
+                                'end_position': start_position + current_length
                             })
                             chunk_index += 1
-                            start_position += len(current_chunk)
-                            current_chunk = sentence + ". "
+                            start_position += current_length
+                            current_parts = [sentence, ". "]
+                            current_length = len(sentence) + 2
                         else:
-                            current_chunk += sentence + ". "
+                            current_parts += (sentence, ". ")
+                            current_length += len(sentence) + 2
                 else:
-                    current_chunk = paragraph
+                    current_parts = [paragraph]
+                    current_length = len(paragraph)
         else:
-            if current_chunk:
-                current_chunk += "\n\n" + paragraph
+            if current_length:
+                current_parts += ("\n\n", paragraph)
+                current_length += 2 + len(paragraph)
             else:
-                current_chunk = paragraph
+                current_parts = [paragraph]
+                current_length = len(paragraph)
     
     # Agregar el último chunk
-    if current_chunk:
+    if current_length:
         chunks.append({
-            'content': current_chunk.strip(),
+            'content': ''.join(current_parts).strip(),
             'chunk_index': chunk_index,
             'start_position': start_position,
             'end_position': len(text)
@@ -112,37 +286,50 @@ async def extract_document(
     """
     Extrae texto de varios formatos de documentos con opción de chunking
     """
+    tmp_path = None
     try:
-        # Leer el archivo
-        content = await file.read()
         filename = file.filename.lower()
+        extension = os.path.splitext(filename)[1]
         
-        # Determinar el tipo de archivo
-        if filename.endswith('.pdf'):
-            result = await extract_pdf(content, extract_tables, ocr_when_needed)
-        elif filename.endswith(('.docx', '.doc')):
-            result = await extract_docx(content)
-        elif filename.endswith(('.xlsx', '.xls')):
-            result = await extract_excel(content)
-        elif filename.endswith(('.pptx', '.ppt')):
-            result = await extract_pptx(content)
-        elif filename.endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp')):
-            result = await extract_image(content)
-        elif filename.endswith(('.txt', '.md')):
-            result = await extract_text(content)
-        else:
+        # Determinar el tipo de archivo antes de leer la subida
+        extractor = EXTRACTORS.get(extension)
+        if extractor is None:
             raise HTTPException(status_code=400, detail=f"Formato no soportado: {filename}")
+        if extractor is extract_pdf:
+            extractor = partial(extract_pdf, extract_tables=extract_tables, use_ocr=ocr_when_needed)
+        
+        # Volcar el archivo a disco por bloques en lugar de leerlo entero en memoria;
+        # la copia completa va a un hilo para que las escrituras no bloqueen el event loop
+        with tempfile.NamedTemporaryFile(
+            suffix=extension, dir=UPLOAD_SPOOL_DIR, delete=False
+        ) as tmp_file:
+            tmp_path = tmp_file.name
+            await file.seek(0)
+            content_hash = await asyncio.to_thread(_spool_upload, file.file, tmp_file)
+        file_size = os.path.getsize(tmp_path)
+        
+        # Reutilizar la extracción si ya se procesó el mismo contenido con las mismas opciones
+        cache_key = (CACHE_VERSION, content_hash, extension, extract_tables, ocr_when_needed)
+        result = await asyncio.to_thread(_result_cache.get, cache_key)
+        
+        if result is None:
+            result = await asyncio.to_thread(extractor, tmp_path)
+            # Un resultado con algún paso fallido puede estar degradado por un fallo pasajero
+            # (p. ej. un worker caído o poppler no disponible): no cachearlo
+            metadata = result.get('metadata', {})
+            if not any(metadata.get(key) for key in RESULT_ERROR_KEYS):
+                await asyncio.to_thread(_result_cache.set, cache_key, result)
         
         # Detectar idioma si se solicita
         if detect_language and result.get('text'):
             try:
-                result['language'] = detect(result['text'][:500])
+                result['language'] = _detect_language(result['text'])
             except:
                 result['language'] = 'unknown'
         
         # Agregar metadata
         result['filename'] = file.filename
-        result['file_size'] = len(content)
+        result['file_size'] = file_size
         result['content_type'] = file.content_type
         
         # Crear chunks si se solicita
@@ -155,10 +342,43 @@ async def extract_document(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+
+def _count_pdf_pages(path: str) -> int:
+    """Worker: devuelve el número de páginas del PDF"""
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
 
-async def extract_pdf(content: bytes, extract_tables: bool = True, use_ocr: bool = True) -> Dict[str, Any]:
+def _extract_pdf_pages(path: str, page_indices: List[int]) -> List[Optional[str]]:
+    """Worker: extrae con PDFium el texto de un lote de páginas del PDF"""
+    # Cada lote abre su propio documento; el PDF se parsea una vez por lote, no por página.
+    # En los workers el lock no tiene competencia; protege la ejecución sin pool
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            texts = []
+            for i in page_indices:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                # PDFium separa las líneas con \r\n
+                texts.append(textpage.get_text_bounded().replace('\r\n', '\n'))
+                textpage.close()
+                page.close()
+            return texts
+        finally:
+            pdf.close()
+
+def extract_pdf(path: str, extract_tables: bool = True, use_ocr: bool = True) -> Dict[str, Any]:
     """Extrae texto de PDF con soporte para OCR y tablas"""
     result = {
         'text': '',
@@ -170,102 +390,224 @@ async def extract_pdf(content: bytes, extract_tables: bool = True, use_ocr: bool
     
     # Intentar extracción normal primero
     try:
-        pdf_file = io.BytesIO(content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        result['pages'] = len(pdf_reader.pages)
+        # PDFium solo se usa en los procesos del pool, nunca en los hilos del servidor
+        result['pages'] = _submit_to_pool(_count_pdf_pages, path).result()
+        
+        # Las páginas son independientes: repartirlas en lotes entre los procesos
+        futures = [
+            _submit_to_pool(_extract_pdf_pages, path, batch)
+            for batch in _split_batches(list(range(result['pages'])))
+        ]
+        page_texts = [text for future in futures for text in future.result()]
+        
+        # Páginas sin texto suficiente (escaneadas o imágenes): solo estas necesitan OCR
+        needs_ocr_pages = [
+            page_num for page_num, page_text in enumerate(page_texts, 1)
+            if not page_text or len(page_text.strip()) < OCR_MIN_PAGE_CHARS
+        ]
+        result['needs_ocr'] = bool(needs_ocr_pages)
         
+        ocr_texts = {}
+        if needs_ocr_pages and use_ocr:
+            try:
+                ocr_texts = dict(zip(needs_ocr_pages, _ocr_pdf(path, needs_ocr_pages)))
+            except Exception as e:
+                # Si falla el OCR, se conserva el texto extraído de esas páginas
+                result['metadata']['ocr_error'] = str(e)
+        
+        # Intercalar el texto OCR en la posición de cada página
         text_parts = []
-        for page_num, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            if page_text and page_text.strip():
-                text_parts.append(f"--- Página {page_num + 1} ---\n{page_text}")
-            else:
-                result['needs_ocr'] = True
+        for page_num, page_text in enumerate(page_texts, 1):
+            if page_num in ocr_texts:
+                text_parts.append(f"--- Página {page_num} (OCR) ---\n{ocr_texts[page_num]}")
+            elif page_text and page_text.strip():
+                text_parts.append(f"--- Página {page_num} ---\n{page_text}")
         
         result['text'] = '\n\n'.join(text_parts)
         
-        # Si no hay texto o muy poco, intentar OCR
-        if (not result['text'].strip() or len(result['text']) < 100) and use_ocr:
-            result['needs_ocr'] = True
-            result['text'] = await extract_pdf_with_ocr(content)
-        
         # Extraer tablas si se solicita
         if extract_tables:
-            result['tables'] = await extract_pdf_tables(content)
+            try:
+                result['tables'] = extract_pdf_tables(path, result['pages'])
+            except Exception as e:
+                # Si fallan las tablas, se conserva el texto
+                result['metadata']['table_error'] = str(e)
             
     except Exception as e:
-        # Si falla PyPDF2, intentar con pdfplumber
+        # Si falla PDFium, intentar con pdfplumber
+        result['metadata']['extraction_error'] = str(e)
         try:
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-                tmp_file.write(content)
-                tmp_path = tmp_file.name
-                
-            with pdfplumber.open(tmp_path) as pdf:
-                result['pages'] = len(pdf.pages)
-                text_parts = []
-                
-                for i, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_parts.append(f"--- Página {i + 1} ---\n{page_text}")
-                
-                result['text'] = '\n\n'.join(text_parts)
-                
-            os.unlink(tmp_path)
-        except:
+            # poppler da el número de páginas sin construirlas en este proceso
+            result['pages'] = pdfinfo_from_path(path)['Pages']
+            
+            # Texto y tablas salen de la misma apertura de cada lote de páginas
+            page_results = _extract_pdfplumber(path, result['pages'], True, extract_tables)
+            text_parts = []
+            
+            for i, (page_text, _) in enumerate(page_results):
+                if page_text:
+                    text_parts.append(f"--- Página {i + 1} ---\n{page_text}")
+            
+            result['text'] = '\n\n'.join(text_parts)
+            result['tables'] = _collect_pdf_tables(page_results)
+        except Exception as e:
+            result['metadata']['fallback_error'] = str(e)
             if use_ocr:
-                result['text'] = await extract_pdf_with_ocr(content)
                 result['needs_ocr'] = True
+                try:
+                    result['text'] = extract_pdf_with_ocr(path)
+                except Exception as e:
+                    result['metadata']['ocr_error'] = str(e)
     
     return result
 
-async def extract_pdf_with_ocr(content: bytes) -> str:
-    """Extrae texto de PDF usando OCR"""
-    try:
-        images = convert_from_bytes(content, dpi=300)
-        text_parts = []
-        
-        for i, image in enumerate(images):
-            text = pytesseract.image_to_string(image, lang='spa+eng')
-            text_parts.append(f"--- Página {i + 1} (OCR) ---\n{text}")
-        
-        return '\n\n'.join(text_parts)
-    except Exception as e:
-        return f"Error en OCR: {str(e)}"
+def _preprocess_for_ocr(image: Image.Image) -> Image.Image:
+    """Binariza la imagen (escala de grises + umbral adaptativo) para tesseract"""
+    gray = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+    )
+    return Image.fromarray(binary)
 
-async def extract_pdf_tables(content: bytes) -> List[Dict[str, Any]]:
-    """Extrae tablas de PDF - temporalmente simplificado"""
+def _ocr_image(image: Image.Image) -> str:
+    """Aplica OCR a una imagen con la API de tesseract del proceso"""
+    global _tess_api
+    image = _preprocess_for_ocr(image)
+    with _tess_lock:
+        # Se inicializa una sola vez por proceso para no recargar los modelos
+        if _tess_api is None:
+            _tess_api = PyTessBaseAPI(lang='spa+eng')
+        _tess_api.SetImage(image)
+        return _tess_api.GetUTF8Text()
+
+def _rasterize_pdf_page(path: str, page_number: int, output_dir: str) -> str:
+    """Rasteriza una página del PDF a un PNG en disco y devuelve su ruta"""
+    # 200 DPI sigue por encima del mínimo útil para tesseract (150)
+    image_paths = convert_from_path(
+        path, dpi=200, first_page=page_number, last_page=page_number,
+        output_folder=output_dir, fmt='png', paths_only=True
+    )
+    return image_paths[0]
+
+def _ocr_pdf_pages(path: str, page_numbers: List[int]) -> List[str]:
+    """Worker: rasteriza desde el archivo y aplica OCR a un lote de páginas del PDF"""
+    texts = []
+    pages = iter(page_numbers)
+    
+    # Productor/consumidor: un hilo rasteriza las páginas siguientes (poppler corre en
+    # su propio proceso) mientras tesseract procesa la actual; como mucho
+    # OCR_PIPELINE_DEPTH páginas esperan en disco
+    with tempfile.TemporaryDirectory() as output_dir, ThreadPoolExecutor(max_workers=1) as rasterizer:
+        pending = deque(
+            rasterizer.submit(_rasterize_pdf_page, path, page_number, output_dir)
+            for page_number in islice(pages, OCR_PIPELINE_DEPTH)
+        )
+        while pending:
+            image_path = pending.popleft().result()
+            next_page = next(pages, None)
+            if next_page is not None:
+                pending.append(rasterizer.submit(_rasterize_pdf_page, path, next_page, output_dir))
+            
+            with Image.open(image_path) as image:
+                texts.append(_ocr_image(image))
+            os.unlink(image_path)
+    
+    return texts
+
+def _ocr_pdf(path: str, page_numbers: List[int]) -> List[str]:
+    """Aplica OCR a las páginas indicadas, en lotes de OCR_BATCH_PAGES repartidos entre los procesos"""
+    # Cada proceso rasteriza sus propias páginas desde el archivo: solo viaja la ruta.
+    # Tesseract ya está cargado en cada proceso, así que lotes pequeños no cuestan arranques
+    futures = [
+        _submit_to_pool(_ocr_pdf_pages, path, page_numbers[i:i + OCR_BATCH_PAGES])
+        for i in range(0, len(page_numbers), OCR_BATCH_PAGES)
+    ]
+    return [text for future in futures for text in future.result()]
+
+def extract_pdf_with_ocr(path: str) -> str:
+    """Extrae texto de PDF usando OCR (lotes de páginas repartidos entre los procesos)"""
+    pages = pdfinfo_from_path(path)['Pages']
+    texts = _ocr_pdf(path, list(range(1, pages + 1)))
+    
+    text_parts = []
+    for i, text in enumerate(texts):
+        text_parts.append(f"--- Página {i + 1} (OCR) ---\n{text}")
+    
+    return '\n\n'.join(text_parts)
+
+def _extract_pdfplumber_pages(path: str, page_numbers: List[int], extract_text: bool,
+                              extract_tables: bool) -> List[Tuple[Optional[str], List]]:
+    """Worker: extrae con pdfplumber el texto y/o las tablas de un lote de páginas"""
+    page_results = []
+    
+    # pages= limita la apertura a las páginas del lote. laparams=None deja desactivado el
+    # análisis de layout de pdfminer (cajas y líneas de texto), que extract_text no usa
+    with pdfplumber.open(path, pages=page_numbers, laparams=None) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text() if extract_text else None
+            tables = page.extract_tables() if extract_tables else []
+            page_results.append((page_text, tables))
+            # Liberar los objetos ya parseados de la página antes de pasar a la siguiente
+            page.flush_cache()
+    
+    return page_results
+
+def _extract_pdfplumber(path: str, pages: int, extract_text: bool,
+                        extract_tables: bool) -> List[Tuple[Optional[str], List]]:
+    """Reparte la extracción con pdfplumber entre los procesos, en orden de página"""
+    futures = [
+        _submit_to_pool(_extract_pdfplumber_pages, path, batch, extract_text, extract_tables)
+        for batch in _split_batches(list(range(1, pages + 1)))
+    ]
+    return [page_result for future in futures for page_result in future.result()]
+
+def _collect_pdf_tables(page_results: List[Tuple[Optional[str], List]]) -> List[Dict[str, Any]]:
+    """Arma la lista de tablas a partir de los resultados por página"""
     tables_data = []
     
-    try:
-        # Por ahora usamos pdfplumber para extraer tablas básicas
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        with pdfplumber.open(tmp_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                tables = page.extract_tables()
-                for i, table in enumerate(tables):
-                    if table:
-                        tables_data.append({
-                            'table_index': i,
-                            'page': page_num + 1,
-                            'data': table
-                        })
-        
-        os.unlink(tmp_path)
-    except Exception as e:
-        # Si falla, simplemente retornar lista vacía
-        pass
+    for page_num, (_, tables) in enumerate(page_results):
+        for i, table in enumerate(tables):
+            if table:
+                tables_data.append({
+                    'table_index': i,
+                    'page': page_num + 1,
+                    'data': table
+                })
     
     return tables_data
 
-async def extract_docx(content: bytes) -> Dict[str, Any]:
+def extract_pdf_tables(path: str, pages: int) -> List[Dict[str, Any]]:
+    """Extrae tablas de PDF - temporalmente simplificado"""
+    # Por ahora usamos pdfplumber para extraer tablas básicas; los errores se propagan
+    # para que extract_pdf los registre
+    page_results = _extract_pdfplumber(path, pages, False, True)
+    
+    return _collect_pdf_tables(page_results)
+
+def _docx_table_rows(table) -> List[List[str]]:
+    """Devuelve el texto de una tabla Word fila por fila"""
+    # row.cells reconstruye la rejilla de toda la tabla en cada fila; aquí se
+    # construye una sola vez y se parte por el número de columnas
+    cells = table._cells
+    column_count = table._column_count
+    
+    # Las celdas combinadas se repiten en la rejilla: leer su texto una sola vez
+    cell_texts = {}
+    texts = []
+    for cell in cells:
+        if id(cell) not in cell_texts:
+            cell_texts[id(cell)] = cell.text
+        texts.append(cell_texts[id(cell)])
+    
+    return [
+        texts[row_idx * column_count:(row_idx + 1) * column_count]
+        for row_idx in range(len(table.rows))
+    ]
+
+def extract_docx(path: str) -> Dict[str, Any]:
     """Extrae texto de archivos Word"""
     try:
-        doc_stream = io.BytesIO(content)
-        doc = Document(doc_stream)
+        doc = Document(path)
         
         text_parts = []
         tables_data = []
@@ -277,10 +619,7 @@ async def extract_docx(content: bytes) -> Dict[str, Any]:
         
         # Extraer tablas
         for i, table in enumerate(doc.tables):
-            table_content = []
-            for row in table.rows:
-                row_content = [cell.text for cell in row.cells]
-                table_content.append(row_content)
+            table_content = _docx_table_rows(table)
             
             tables_data.append({
                 'table_index': i,
@@ -295,35 +634,51 @@ async def extract_docx(content: bytes) -> Dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando DOCX: {str(e)}")
 
-async def extract_excel(content: bytes) -> Dict[str, Any]:
+def _extract_sheet(sheet) -> Tuple[List[List[str]], int, int]:
+    """Lee los valores de una hoja y devuelve sus filas no vacías y dimensiones"""
+    sheet_content = []
+    row_count = 0
+    column_count = 0
+    
+    # En modo solo lectura sheet.values se limita a la dimensión declarada en el archivo,
+    # que algunos exportadores escriben mal (p. ej. 'A1'); se ignora y se cuenta al leer
+    sheet.reset_dimensions()
+    
+    # sheet.values devuelve tuplas de valores, sin crear un objeto Cell por celda
+    for row in sheet.values:
+        row_count += 1
+        column_count = max(column_count, len(row))
+        row_values = [str(value) for value in row if value is not None]
+        if row_values:
+            sheet_content.append(row_values)
+    
+    return sheet_content, row_count, column_count
+
+def extract_excel(path: str) -> Dict[str, Any]:
     """Extrae datos de archivos Excel"""
     try:
-        excel_stream = io.BytesIO(content)
-        workbook = openpyxl.load_workbook(excel_stream, data_only=True)
+        # read_only usa el lector en streaming, de memoria constante
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        
+        try:
+            sheets = [workbook[sheet_name] for sheet_name in workbook.sheetnames]
+            with ThreadPoolExecutor(max_workers=min(len(sheets), CPU_COUNT) or 1) as executor:
+                sheets_results = list(executor.map(_extract_sheet, sheets))
+        finally:
+            workbook.close()
         
         sheets_data = []
         all_text = []
         
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            sheet_content = []
-            
-            for row in sheet.iter_rows():
-                row_values = []
-                for cell in row:
-                    if cell.value is not None:
-                        row_values.append(str(cell.value))
-                
-                if row_values:
-                    sheet_content.append(row_values)
-                    all_text.append(' | '.join(row_values))
+        for sheet_name, (sheet_content, rows, columns) in zip(workbook.sheetnames, sheets_results):
+            all_text.extend(' | '.join(row_values) for row_values in sheet_content)
             
             if sheet_content:
                 sheets_data.append({
                     'sheet_name': sheet_name,
                     'data': sheet_content,
-                    'rows': sheet.max_row,
-                    'columns': sheet.max_column
+                    'rows': rows,
+                    'columns': columns
                 })
         
         return {
@@ -334,11 +689,10 @@ async def extract_excel(content: bytes) -> Dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando Excel: {str(e)}")
 
-async def extract_pptx(content: bytes) -> Dict[str, Any]:
+def extract_pptx(path: str) -> Dict[str, Any]:
     """Extrae texto de presentaciones PowerPoint"""
     try:
-        pptx_stream = io.BytesIO(content)
-        presentation = Presentation(pptx_stream)
+        presentation = Presentation(path)
         
         slides_content = []
         all_text = []
@@ -348,11 +702,14 @@ async def extract_pptx(content: bytes) -> Dict[str, Any]:
             
             # Extraer texto de shapes
             for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    slide_text.append(shape.text)
+                if shape.has_text_frame:
+                    shape_text = shape.text_frame.text
+                    if shape_text:
+                        slide_text.append(shape_text)
             
             # Extraer notas del presentador
-            if slide.notes_slide:
+            # has_notes_slide evita que notes_slide cree una página de notas vacía
+            if slide.has_notes_slide:
                 notes_text = slide.notes_slide.notes_text_frame.text
                 if notes_text:
                     slide_text.append(f"[Notas: {notes_text}]")
@@ -373,13 +730,11 @@ async def extract_pptx(content: bytes) -> Dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando PowerPoint: {str(e)}")
 
-async def extract_image(content: bytes) -> Dict[str, Any]:
-    """Extrae texto de imágenes usando OCR"""
-    try:
-        image = Image.open(io.BytesIO(content))
-        
+def _ocr_image_file(path: str) -> Tuple[str, Dict[str, Any]]:
+    """Worker: aplica OCR a un archivo de imagen y devuelve el texto y su metadata"""
+    with Image.open(path) as image:
         # OCR
-        text = pytesseract.image_to_string(image, lang='spa+eng')
+        text = _ocr_image(image)
         
         # Metadata de la imagen
         metadata = {
@@ -389,6 +744,14 @@ async def extract_image(content: bytes) -> Dict[str, Any]:
             'width': image.width,
             'height': image.height
         }
+    
+    return text, metadata
+
+def extract_image(path: str) -> Dict[str, Any]:
+    """Extrae texto de imágenes usando OCR"""
+    try:
+        # El OCR corre en el pool de procesos, como el de los PDF
+        text, metadata = _submit_to_pool(_ocr_image_file, path).result()
         
         return {
             'text': text.strip(),
@@ -398,24 +761,47 @@ async def extract_image(content: bytes) -> Dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
 
-async def extract_text(content: bytes) -> Dict[str, Any]:
+def extract_text(path: str) -> Dict[str, Any]:
     """Extrae texto de archivos de texto plano"""
-    try:
-        text = content.decode('utf-8')
-        return {
-            'text': text,
-            'lines': len(text.split('\n')),
-            'characters': len(text)
-        }
-    except UnicodeDecodeError:
-        # Intentar con otro encoding
-        text = content.decode('latin-1')
-        return {
-            'text': text,
-            'lines': len(text.split('\n')),
-            'characters': len(text),
-            'encoding': 'latin-1'
-        }
+    with open(path, 'rb') as text_file:
+        content = text_file.read()
+    
+    # Detectar la codificación con una muestra del inicio, cortada en un salto de línea
+    # para no partir un carácter multibyte, y decodificar el archivo una sola vez.
+    # El corte se deja en longitud par: en UTF-16 cada unidad ocupa dos bytes y
+    # cortar antes del propio salto de línea sigue siendo válido en UTF-8
+    sample = content[:ENCODING_SAMPLE_SIZE]
+    if len(content) > ENCODING_SAMPLE_SIZE and b'\n' in sample:
+        cut = sample.rfind(b'\n') + 1
+        sample = sample[:cut - cut % 2]
+    best_match = from_bytes(sample, cp_isolation=TEXT_ENCODINGS).best()
+    encoding = best_match.encoding if best_match else 'latin_1'
+    
+    text = content.decode(encoding, errors='replace')
+    return {
+        'text': text,
+        'lines': text.count('\n') + 1,
+        'characters': len(text),
+        'encoding': encoding
+    }
+
+# Extractor para cada extensión soportada
+EXTRACTORS = {
+    '.pdf': extract_pdf,
+    '.docx': extract_docx,
+    '.doc': extract_docx,
+    '.xlsx': extract_excel,
+    '.xls': extract_excel,
+    '.pptx': extract_pptx,
+    '.ppt': extract_pptx,
+    '.png': extract_image,
+    '.jpg': extract_image,
+    '.jpeg': extract_image,
+    '.tiff': extract_image,
+    '.bmp': extract_image,
+    '.txt': extract_text,
+    '.md': extract_text,
+}
 
 if __name__ == "__main__":
     import uvicorn